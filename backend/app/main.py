@@ -1,24 +1,38 @@
 import asyncio
-import json
+import concurrent.futures
+import dataclasses
+import logging
 import os
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Form, Query
-from fastapi.responses import HTMLResponse, FileResponse, Response
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Form, Query, Request
+from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import MutableHeaders
 
 from aiortc import RTCPeerConnection, RTCSessionDescription
 from aiortc.contrib.media import MediaBlackhole
+from aiortc.mediastreams import MediaStreamError
 
 import numpy as np
 import cv2
 import onnxruntime as ort
+import msgpack
+import orjson
+
+try:
+    from numba import njit
+except ImportError:  # optional: fall back to the NumPy kernel below
+    njit = None
 
 MODE = os.getenv("MODE", "wasm")
 
-app = FastAPI()
+# uvicorn installs a handler on this logger; a module logger would have none
+logger = logging.getLogger("uvicorn.error")
+
+app = FastAPI(default_response_class=ORJSONResponse)
 
 origins = os.getenv("CORS_ORIGINS", "").split(",") if os.getenv("CORS_ORIGINS") else ["*"]
 app.add_middleware(
@@ -29,13 +43,99 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add CORS headers for cross-origin isolation
-@app.middleware("http")
-async def add_cors_headers(request, call_next):
-    response = await call_next(request)
-    response.headers["Cross-Origin-Embedder-Policy"] = "require-corp"
-    response.headers["Cross-Origin-Opener-Policy"] = "same-origin"
-    return response
+# Add CORS headers for cross-origin isolation. Plain ASGI so the headers are
+# patched on the response-start message without building a Request per call
+class COEPHeadersMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["Cross-Origin-Embedder-Policy"] = "require-corp"
+                headers["Cross-Origin-Opener-Policy"] = "same-origin"
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+app.add_middleware(COEPHeadersMiddleware)
+
+
+_CC_LEFT, _CC_TOP, _CC_WIDTH, _CC_HEIGHT, _CC_AREA = (
+    cv2.CC_STAT_LEFT,
+    cv2.CC_STAT_TOP,
+    cv2.CC_STAT_WIDTH,
+    cv2.CC_STAT_HEIGHT,
+    cv2.CC_STAT_AREA,
+)
+
+
+def _normalize_boxes_np(stats: np.ndarray, inv_w: float, inv_h: float, min_area: int):
+    # stats: (N, 5) connected-component stats -> keep mask + (N, 4) normalized xmin/ymin/xmax/ymax
+    mask = stats[:, _CC_AREA] >= min_area
+    boxes = np.empty((stats.shape[0], 4), np.float64)
+    boxes[:, 0] = stats[:, _CC_LEFT] * inv_w
+    boxes[:, 1] = stats[:, _CC_TOP] * inv_h
+    boxes[:, 2] = (stats[:, _CC_LEFT] + stats[:, _CC_WIDTH]) * inv_w
+    boxes[:, 3] = (stats[:, _CC_TOP] + stats[:, _CC_HEIGHT]) * inv_h
+    return mask, boxes
+
+
+def _normalize_boxes_loop(stats, inv_w, inv_h, min_area):
+    n = stats.shape[0]
+    mask = np.empty(n, np.bool_)
+    boxes = np.empty((n, 4), np.float64)
+    for i in range(n):
+        x = stats[i, _CC_LEFT]
+        y = stats[i, _CC_TOP]
+        mask[i] = stats[i, _CC_AREA] >= min_area
+        boxes[i, 0] = x * inv_w
+        boxes[i, 1] = y * inv_h
+        boxes[i, 2] = (x + stats[i, _CC_WIDTH]) * inv_w
+        boxes[i, 3] = (y + stats[i, _CC_HEIGHT]) * inv_h
+    return mask, boxes
+
+
+# Same contract as _normalize_boxes_np; JIT'd once and cached on disk when Numba is installed
+_normalize_boxes = njit(cache=True, fastmath=True)(_normalize_boxes_loop) if njit else _normalize_boxes_np
+
+
+def _cpu_has_vnni() -> bool:
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_vnni" in flags or "avx_vnni" in flags
+
+
+_ORT_DTYPES = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(int64)": np.int64,
+    "tensor(int32)": np.int32,
+    "tensor(uint8)": np.uint8,
+}
+
+
+class StreamState:
+    # Per-stream detector state. Motion gate: L1 distance between 80x60 thumbnails
+    # of this frame and the last one of the same stream that was actually
+    # processed; below the threshold, its boxes are reused
+    def __init__(self) -> None:
+        self.small_bufs = (np.empty((60, 80), np.uint8), np.empty((60, 80), np.uint8))
+        self.prev_small: Optional[np.ndarray] = None
+        self.last_dets: list[Dict[str, Any]] = []
+        # Binary threshold level: this stream's mean brightness, refreshed every
+        # 30 processed frames
+        self.thresh_level = 128.0
+        self.frame_count = 0
 
 
 class SimpleDetector:
@@ -43,51 +143,319 @@ class SimpleDetector:
         # Placeholder detector: returns empty list; replace with real ONNX model if MODE==server
         self.input_size = (240, 320)
         self.labels = ["person", "bottle", "cup", "phone"]
+        self._inv_h = 1.0 / self.input_size[0]
+        self._inv_w = 1.0 / self.input_size[1]
+        # Scratch buffers reused across frames (input_size is fixed); the
+        # full-resolution gray buffer follows the incoming frame shape
+        self._gray_full_buf: Optional[np.ndarray] = None
+        self._gray_buf = np.empty(self.input_size, np.uint8)
+        self._thresh_buf = np.empty(self.input_size, np.uint8)
+        self._cc_labels_buf = np.empty(self.input_size, np.int32)
+        # Motion gate threshold (L1 sum over the 80x60 thumbnail, see StreamState)
+        self.motion_thresh = int(os.getenv("MOTION_THRESH", "9600"))
+        self._rng = np.random.default_rng()
+        self._labels_arr = np.array(self.labels)
+        # Compile (or load the cached) box kernel now rather than on the first frame
+        _normalize_boxes(np.zeros((1, 5), np.int32), self._inv_w, self._inv_h, 200)
         self.last_frame: Optional[np.ndarray] = None
         self.session: Optional[ort.InferenceSession] = None
+        self._input_ortvalue: Optional[ort.OrtValue] = None
+        self._input_key: Optional[tuple] = None
+        self._output_cache: Dict[int, Optional[list[tuple[np.ndarray, ort.OrtValue]]]] = {}
+        self._model_hw = self.input_size
+        self.model_max_batch: Optional[int] = None
+        self.model_labels = [name for name in os.getenv("ONNX_LABELS", "").split(",") if name]
+        self.score_thresh = float(os.getenv("SCORE_THRESH", "0.5"))
         self._maybe_init_model()
 
     def _maybe_init_model(self) -> None:
         if MODE == "server":
-            # Load a tiny ONNX model if available (user can mount). For now, keep None and produce mock detections.
-            try:
-                model_path = os.getenv("ONNX_MODEL", "")
-                if model_path and os.path.exists(model_path):
-                    providers = ["CPUExecutionProvider"]
-                    self.session = ort.InferenceSession(model_path, providers=providers)
-            except Exception:
-                self.session = None
-
-    def infer(self, frame: np.ndarray) -> list[Dict[str, Any]]:
-        # Downscale and simulate detection to keep CPU modest
-        h, w = frame.shape[:2]
-        resized = cv2.resize(frame, (self.input_size[1], self.input_size[0]))
-        gray = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
+            # Load a tiny ONNX model if available (user can mount). Prefer an INT8
+            # build (see app/quantize.py) so MLAS can use VNNI kernels, and fall back
+            # to the FP32 model if it's missing or fails to load
+            for model_path in (os.getenv("ONNX_MODEL_INT8", ""), os.getenv("ONNX_MODEL", "")):
+                if not model_path or not os.path.exists(model_path):
+                    continue
+                try:
+                    self._load_session(model_path)
+                except Exception:
+                    logger.exception("Failed to load ONNX model %s", model_path)
+                    self.session = None
+                    continue
+                logger.info(
+                    "Loaded %s providers=%s vnni=%s", model_path, self.session.get_providers(), _cpu_has_vnni()
+                )
+                return
+
+    def _load_session(self, model_path: str) -> None:
+        so = ort.SessionOptions()
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        so.intra_op_num_threads = int(os.getenv("ORT_INTRA", "0")) or (os.cpu_count() or 1)
+        so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        so.enable_mem_pattern = True
+        so.enable_cpu_mem_arena = True
+        self.session = ort.InferenceSession(model_path, sess_options=so, providers=ort.get_available_providers())
+        # Contract (see README "Server model"): one float32 NCHW RGB input and a
+        # first output of (batch, N, 6) rows [xmin, ymin, xmax, ymax, score, class]
+        # in input pixels. Anything else is rejected here rather than failing per frame
+        inp = self.session.get_inputs()[0]
+        shape = inp.shape
+        if inp.type != "tensor(float)" or len(shape) != 4 or shape[1] != 3:
+            raise ValueError(f"unsupported model input {inp.type} {shape}; expected float32 Nx3xHxW")
+        if isinstance(shape[0], int) and shape[0] != 1:
+            raise ValueError(f"unsupported static batch size {shape[0]}")
+        out = self.session.get_outputs()[0]
+        if len(out.shape) != 3 or out.shape[2] != 6:
+            raise ValueError(f"unsupported model output {out.shape}; expected (batch, N, 6)")
+        self._input_name = inp.name
+        self._output_names = [o.name for o in self.session.get_outputs()]
+        # A static batch of 1 caps the batcher; symbolic batch dims take BATCH
+        self.model_max_batch = 1 if shape[0] == 1 else None
+        # Fall back to the detector size for symbolic H/W
+        if isinstance(shape[2], int) and isinstance(shape[3], int):
+            self._model_hw = (shape[2], shape[3])
+
+    def run_session(self, inp: np.ndarray) -> list[np.ndarray]:
+        # Run the model through IOBinding, reusing the bound input OrtValue while
+        # the input shape/dtype stays the same
+        assert self.session is not None
+        inp = np.ascontiguousarray(inp)
+        key = (inp.shape, inp.dtype)
+        if self._input_ortvalue is None or self._input_key != key:
+            self._input_ortvalue = ort.OrtValue.ortvalue_from_numpy(inp)
+            self._input_key = key
+        else:
+            self._input_ortvalue.update_inplace(inp)
+        io = self.session.io_binding()
+        io.bind_ortvalue_input(self._input_name, self._input_ortvalue)
+        outputs = self._output_bufs(inp.shape[0])
+        if outputs is None:
+            # Some output has a data-dependent shape: let ORT allocate it
+            for name in self._output_names:
+                io.bind_output(name)
+            self.session.run_with_iobinding(io)
+            return io.copy_outputs_to_cpu()
+        for name, (_, ortvalue) in zip(self._output_names, outputs):
+            io.bind_ortvalue_output(name, ortvalue)
+        self.session.run_with_iobinding(io)
+        # ORT wrote straight into these arrays; they are reused by the next run
+        return [arr for arr, _ in outputs]
+
+    def _output_bufs(self, batch: int) -> Optional[list[tuple[np.ndarray, ort.OrtValue]]]:
+        # Preallocated output arrays per batch size, or None unless every output
+        # shape is static apart from a leading batch dim
+        if batch in self._output_cache:
+            return self._output_cache[batch]
+        bufs: Optional[list[tuple[np.ndarray, ort.OrtValue]]] = []
+        for o in self.session.get_outputs():
+            dims = list(o.shape)
+            if dims and not isinstance(dims[0], int):
+                dims[0] = batch
+            dtype = _ORT_DTYPES.get(o.type)
+            if dtype is None or not all(isinstance(d, int) for d in dims):
+                bufs = None
+                break
+            arr = np.empty(dims, dtype)
+            bufs.append((arr, ort.OrtValue.ortvalue_from_numpy(arr)))
+        self._output_cache[batch] = bufs
+        return bufs
+
+    def infer_batch(self, frames: list[np.ndarray]) -> list[list[Dict[str, Any]]]:
+        # One model Run() for the whole batch: BGR uint8 -> RGB float32 NCHW in [0, 1]
+        mh, mw = self._model_hw
+        batch = np.stack([cv2.resize(f, (mw, mh)) for f in frames])
+        batch = batch[..., ::-1].transpose(0, 3, 1, 2).astype(np.float32) * (1.0 / 255.0)
+        out = self.run_session(batch)[0]
+        return [self._decode(out[i]) for i in range(len(frames))]
+
+    def _decode(self, rows: np.ndarray) -> list[Dict[str, Any]]:
+        # rows: (N, 6) [xmin, ymin, xmax, ymax, score, class] in model-input pixels
+        rows = rows[rows[:, 4] >= self.score_thresh]
+        mh, mw = self._model_hw
+        boxes = np.clip(rows[:, :4] * (1.0 / mw, 1.0 / mh, 1.0 / mw, 1.0 / mh), 0.0, 1.0)
+        labels = self.model_labels
+        return [
+            {
+                "label": labels[c] if 0 <= c < len(labels) else str(c),
+                "score": sc,
+                "xmin": x0,
+                "ymin": y0,
+                "xmax": x1,
+                "ymax": y1,
+            }
+            for (x0, y0, x1, y1), sc, c in zip(
+                boxes.tolist(), rows[:, 4].tolist(), rows[:, 5].astype(np.int64).tolist()
+            )
+        ]
+
+    def infer(self, frame: np.ndarray, stream: Optional[StreamState] = None) -> list[Dict[str, Any]]:
+        # Convert to gray first so the resize only moves a single channel
+        if self._gray_full_buf is None or self._gray_full_buf.shape != frame.shape[:2]:
+            self._gray_full_buf = np.empty(frame.shape[:2], np.uint8)
+        return self.infer_gray(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray_full_buf), stream)
+
+    def infer_gray(self, gray_full: np.ndarray, stream: Optional[StreamState] = None) -> list[Dict[str, Any]]:
+        # Downscale and simulate detection to keep CPU modest; decimate straight
+        # into the reusable buffer. Without a stream there is nothing to gate against
+        gray = cv2.resize(
+            gray_full, (self.input_size[1], self.input_size[0]), dst=self._gray_buf, interpolation=cv2.INTER_AREA
+        )
+        if stream is None:
+            return self._detect(gray)
+        dst = stream.small_bufs[1] if stream.prev_small is stream.small_bufs[0] else stream.small_bufs[0]
+        small = cv2.resize(gray, (80, 60), dst=dst, interpolation=cv2.INTER_AREA)
+        if stream.prev_small is not None and cv2.norm(small, stream.prev_small, cv2.NORM_L1) < self.motion_thresh:
+            return stream.last_dets
+        stream.prev_small = small
+        stream.last_dets = self._detect(gray, stream)
+        return stream.last_dets
+
+    def _detect(self, gray: np.ndarray, stream: Optional[StreamState] = None) -> list[Dict[str, Any]]:
         # Simple motion-like heuristic to fake some boxes for demo
-        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_OTSU)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        detections: list[Dict[str, Any]] = []
-        for c in contours[:3]:
-            x, y, cw, ch = cv2.boundingRect(c)
-            if cw * ch < 200:  # filter tiny
-                continue
-            xmin = x / self.input_size[1]
-            ymin = y / self.input_size[0]
-            xmax = (x + cw) / self.input_size[1]
-            ymax = (y + ch) / self.input_size[0]
-            detections.append({
-                "label": np.random.choice(self.labels).item(),
-                "score": float(np.random.uniform(0.5, 0.95)),
-                "xmin": float(xmin),
-                "ymin": float(ymin),
-                "xmax": float(xmax),
-                "ymax": float(ymax),
-            })
-        return detections
+        # Fixed binary threshold instead of Otsu's per-frame histogram; the level
+        # tracks the stream's mean brightness (this frame's, without a stream)
+        if stream is None:
+            level = cv2.mean(gray)[0]
+        else:
+            if stream.frame_count % 30 == 0:
+                stream.thresh_level = cv2.mean(gray)[0]
+            stream.frame_count += 1
+            level = stream.thresh_level
+        _, thresh = cv2.threshold(gray, level, 255, cv2.THRESH_BINARY, dst=self._thresh_buf)
+        # One linear labelling pass; stats come back as an (N, 5) array so the
+        # filter/normalize below runs vectorized instead of per contour
+        _, _, stats, _ = cv2.connectedComponentsWithStats(
+            thresh, labels=self._cc_labels_buf, connectivity=8
+        )
+        stats = stats[1:]  # drop background label
+        mask, boxes = _normalize_boxes(stats, self._inv_w, self._inv_h, 200)  # filter tiny
+        areas = stats[mask, _CC_AREA]
+        boxes = boxes[mask]
+        if len(boxes) > 3:
+            boxes = boxes[np.argpartition(-areas, 3)[:3]]
+        k = len(boxes)
+        if k == 0:
+            return []
+        xmin, ymin, xmax, ymax = boxes.T
+        labels = self._labels_arr[self._rng.integers(0, len(self._labels_arr), size=k)]
+        scores = self._rng.uniform(0.5, 0.95, size=k)
+        return [
+            {
+                "label": li,
+                "score": sc,
+                "xmin": x0,
+                "ymin": y0,
+                "xmax": x1,
+                "ymax": y1,
+            }
+            for li, sc, x0, y0, x1, y1 in zip(
+                labels.tolist(), scores.tolist(), xmin.tolist(), ymin.tolist(), xmax.tolist(), ymax.tolist()
+            )
+        ]
 
 
 detector = SimpleDetector()
-latest_result: Optional[Dict[str, Any]] = None
+# Single worker: keeps OpenCV off the event loop and serializes access to the
+# detector's reusable buffers
+_INFER_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+
+class FrameBatcher:
+    # Coalesces frames submitted within max_delay_ms (across all tracks) into one
+    # call of fn(frames) -> per-frame results, bounded by max_batch. Each track
+    # waits for its result before submitting again, so a batch is dispatched as
+    # soon as every attached track (plus any one-shot callers already queued) is
+    # in it; the delay only applies while other producers are still outstanding
+    def __init__(self, fn, max_batch: int, max_delay_ms: float) -> None:
+        self._fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay_ms / 1000.0
+        self._streams = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def attach(self) -> None:
+        # A track that will keep submitting frames
+        self._streams += 1
+
+    def detach(self) -> None:
+        self._streams -= 1
+
+    async def submit(self, img: np.ndarray, oneshot: bool = False) -> list[Dict[str, Any]]:
+        # oneshot: the caller is not an attached track (e.g. POST /infer)
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((img, fut, oneshot))
+        return await fut
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(items) < self.max_batch:
+                # Nobody else can submit before these results come back
+                if len(items) >= self._streams + sum(1 for item in items if item[2]):
+                    break
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = await loop.run_in_executor(_INFER_POOL, self._fn, [img for img, _, _ in items])
+            except Exception as e:
+                for _, fut, _ in items:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut, _), res in zip(items, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+
+# Only when a model passed the load-time contract check; the simulated path stays B=1
+batcher: Optional[FrameBatcher] = (
+    FrameBatcher(
+        detector.infer_batch,
+        detector.model_max_batch or int(os.getenv("BATCH", "4")),
+        float(os.getenv("BATCH_DELAY_MS", "8")),
+    )
+    if MODE == "server" and detector.session is not None
+    else None
+)
+
+
+@dataclasses.dataclass(slots=True)
+class DetMessage:
+    # Fixed-shape per-frame result for the WebRTC path; orjson serializes it
+    # natively and to_msgpack splices values into pre-packed keys
+    frame_id: int
+    capture_ts: int
+    recv_ts: int
+    inference_ts: int
+    detections: list[Dict[str, Any]]
+
+    def to_msgpack(self) -> bytes:
+        pack = _MSGPACK_PACKER.pack
+        parts = [_MSGPACK_HEADER]
+        for key, name in zip(_MSGPACK_KEYS, _MSGPACK_FIELDS):
+            parts.append(key)
+            parts.append(pack(getattr(self, name)))
+        return b"".join(parts)
+
+
+_MSGPACK_PACKER = msgpack.Packer(use_bin_type=True)
+_MSGPACK_FIELDS = tuple(f.name for f in dataclasses.fields(DetMessage))
+assert len(_MSGPACK_FIELDS) < 16, "fixmap holds at most 15 entries"
+_MSGPACK_KEYS = tuple(msgpack.packb(name) for name in _MSGPACK_FIELDS)
+_MSGPACK_HEADER = bytes([0x80 | len(_MSGPACK_KEYS)])  # fixmap, one entry per field
+
+latest_result: Optional[Union[Dict[str, Any], DetMessage]] = None
 
 
 @app.get("/health")
@@ -109,13 +477,12 @@ async def ws_endpoint(ws: WebSocket, room: str = Query("default")):
     try:
         while True:
             message = await ws.receive_text()
-            for cid, cws in list(rooms.get(room, {}).items()):
-                if cid == client_id:
-                    continue
-                try:
-                    await cws.send_text(message)
-                except Exception:
-                    pass
+            peers = [(cid, cws) for cid, cws in rooms.get(room, {}).items() if cid != client_id]
+            # Fan out concurrently so one slow peer doesn't hold up the rest
+            results = await asyncio.gather(*(cws.send_text(message) for _, cws in peers), return_exceptions=True)
+            for (cid, _), res in zip(peers, results):
+                if isinstance(res, Exception):
+                    rooms.get(room, {}).pop(cid, None)
     except WebSocketDisconnect:
         try:
             rooms[room].pop(client_id, None)
@@ -125,54 +492,130 @@ async def ws_endpoint(ws: WebSocket, room: str = Query("default")):
             pass
 
 
+class LatestFrame:
+    # Drains a track in the background and keeps only the newest frame, so slow
+    # inference skips stale frames instead of falling further behind real time
+    def __init__(self, track) -> None:
+        self._track = track
+        self._frame = None
+        self._arrival_ts = 0
+        self._event = asyncio.Event()
+        self._ended = False
+        self._task = asyncio.create_task(self._pump())
+
+    async def _pump(self) -> None:
+        try:
+            while True:
+                self._frame = await self._track.recv()
+                self._arrival_ts = int(time.time() * 1000)
+                self._event.set()
+        except MediaStreamError:
+            pass
+        finally:
+            self._ended = True
+            self._event.set()
+
+    async def get(self):
+        # (newest frame since the last call, its arrival time in ms); None once
+        # the track has ended
+        await self._event.wait()
+        if not self._ended:
+            self._event.clear()
+        frame, self._frame = self._frame, None
+        return None if frame is None else (frame, self._arrival_ts)
+
+
 # Minimal WebRTC endpoint for server-side inference pathway
 @app.post("/offer")
 async def offer(sdp: Dict[str, Any]):
     pc = RTCPeerConnection()
     media_blackhole = MediaBlackhole()
-    result_queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(maxsize=1)
-    results_channel = pc.createDataChannel("results")
+    result_queue: asyncio.Queue[DetMessage] = asyncio.Queue(maxsize=1)
+    # Results go out as binary MessagePack; clients that want text can ask for
+    # JSON via "results_format" in the offer body. The choice is echoed in the
+    # channel's protocol so the receiver knows how to decode
+    results_format = "json" if sdp.get("results_format") == "json" else "msgpack"
+    results_channel = pc.createDataChannel("results", protocol=results_format)
 
     @pc.on("track")
     def on_track(track):
         async def recv_frames():
             frame_id = 0
             last_sent_ts = 0.0
-            async for frame in track.recv():
+            loop = asyncio.get_running_loop()
+            latest_frame = LatestFrame(track)
+            stream = StreamState()
+            # RTP clock state: first arrival, last pts and ticks elapsed since the first frame
+            pts_anchor: Optional[int] = None
+            prev_pts = 0
+            pts_ticks = 0
+            while True:
+                got = await latest_frame.get()
+                if got is None:
+                    break
+                frame, recv_ts = got
                 frame_id += 1
-                capture_ts = int(time.time() * 1000)
-                img = frame.to_ndarray(format="bgr24")
-                recv_ts = int(time.time() * 1000)
-                t0 = time.time()
-                dets = detector.infer(img)
+                # Sender capture time estimated from the RTP pts, anchored at the
+                # first frame's arrival; never later than this frame's arrival. pts is
+                # the 32-bit RTP timestamp (random start, wraps), so accumulate
+                # unwrapped deltas rather than subtracting from the first pts
+                if frame.pts is None or frame.time_base is None:
+                    capture_ts = recv_ts
+                else:
+                    if pts_anchor is None:
+                        pts_anchor = recv_ts
+                    else:
+                        delta = (frame.pts - prev_pts) % 2**32
+                        pts_ticks += delta - 2**32 if delta >= 2**31 else delta
+                    prev_pts = frame.pts
+                    capture_ts = min(recv_ts, pts_anchor + int(pts_ticks * frame.time_base * 1000))
+                try:
+                    if batcher is not None:
+                        # The model needs colour, so this path can't use the Y plane
+                        dets = await batcher.submit(frame.to_ndarray(format="bgr24"))
+                    elif frame.format.name in ("yuv420p", "nv12"):
+                        # Y plane is already grayscale: view it in place and skip the BGR conversion
+                        plane = frame.planes[0]
+                        y = np.frombuffer(plane, np.uint8, count=frame.height * plane.line_size)
+                        y = y.reshape(frame.height, plane.line_size)[:, : frame.width]
+                        dets = await loop.run_in_executor(_INFER_POOL, detector.infer_gray, y, stream)
+                    else:
+                        img = frame.to_ndarray(format="bgr24")
+                        dets = await loop.run_in_executor(_INFER_POOL, detector.infer, img, stream)
+                except Exception:
+                    # Drop this frame but keep the track alive
+                    logger.exception("Inference failed on frame %d", frame_id)
+                    continue
                 inference_ts = int(time.time() * 1000)
-                message = {
-                    "frame_id": frame_id,
-                    "capture_ts": capture_ts,
-                    "recv_ts": recv_ts,
-                    "inference_ts": inference_ts,
-                    "detections": dets,
-                }
+                message = DetMessage(frame_id, capture_ts, recv_ts, inference_ts, dets)
                 # Backpressure: keep only latest
-                while not result_queue.empty():
-                    try:
-                        result_queue.get_nowait()
-                    except Exception:
-                        break
-                await result_queue.put(message)
+                try:
+                    result_queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    result_queue.get_nowait()
+                    result_queue.put_nowait(message)
                 global latest_result
                 latest_result = message
                 # Try pushing over DataChannel if open
                 try:
                     if results_channel and results_channel.readyState == "open":
-                        # Send as text JSON
-                        results_channel.send(json.dumps(message))
+                        if results_format == "msgpack":
+                            results_channel.send(message.to_msgpack())
+                        else:
+                            results_channel.send(orjson.dumps(message).decode())
                 except Exception:
                     pass
-                # Avoid overwhelming CPU
-                elapsed = time.time() - t0
-                await asyncio.sleep(max(0.0, 1.0 / 15.0 - elapsed))
-        asyncio.create_task(recv_frames())
+
+        async def run_track():
+            # Registered with the batcher for as long as this track can submit frames
+            if batcher is not None:
+                batcher.attach()
+            try:
+                await recv_frames()
+            finally:
+                if batcher is not None:
+                    batcher.detach()
+        asyncio.create_task(run_track())
 
     @pc.on("connectionstatechange")
     async def on_connstate():
@@ -200,8 +643,12 @@ async def offer(sdp: Dict[str, Any]):
 
 @app.get("/latest")
 async def latest():
-    # Pull latest inference result (for server mode). If none, return empty detections
-    return latest_result or {"frame_id": -1, "capture_ts": 0, "recv_ts": 0, "inference_ts": 0, "detections": []}
+    # Pull latest inference result (for server mode). If none, return empty detections.
+    # Hot handlers return ORJSONResponse directly so FastAPI's jsonable_encoder pass
+    # is skipped; orjson serializes dicts and the DetMessage dataclass itself
+    return ORJSONResponse(
+        latest_result or {"frame_id": -1, "capture_ts": 0, "recv_ts": 0, "inference_ts": 0, "detections": []}
+    )
 
 
 @app.post("/infer")
@@ -215,7 +662,11 @@ async def infer_endpoint(
     buf = np.frombuffer(data, dtype=np.uint8)
     img = cv2.imdecode(buf, cv2.IMREAD_COLOR)
     recv_ts = int(time.time() * 1000)
-    dets = detector.infer(img)
+    if batcher is not None:
+        # Same model path as WebRTC tracks, batched with any in-flight track frames
+        dets = await batcher.submit(img, oneshot=True)
+    else:
+        dets = await asyncio.get_running_loop().run_in_executor(_INFER_POOL, detector.infer, img)
     inference_ts = int(time.time() * 1000)
     response = {
         "frame_id": frame_id,
@@ -226,20 +677,82 @@ async def infer_endpoint(
     }
     global latest_result
     latest_result = response
-    return response
+    return ORJSONResponse(response)
 
 
 # Simple in-memory metrics aggregation
-metrics_store: list[Dict[str, Any]] = []
+_INT64_MAX = int(np.iinfo(np.int64).max)
+
+
+def _as_float(value: Any) -> float:
+    # Missing or non-numeric metric fields count as 0, like the old .get(..., 0) defaults
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class MetricsRing:
+    # Fixed-capacity store kept as parallel arrays; once full the oldest slot is overwritten
+    def __init__(self, capacity: int = 10000) -> None:
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, np.int64)
+        self.lat = np.zeros(capacity, np.float64)
+        self.up = np.zeros(capacity, np.float64)
+        self.down = np.zeros(capacity, np.float64)
+        self.cursor = 0
+        self.count = 0
+        # Appends left until the last out-of-order pair is evicted; 0 means ts is sorted
+        self._unsorted = 0
+
+    def append(self, payload: Dict[str, Any]) -> bool:
+        # Entries without a usable positive ts can never fall inside a window: skip them
+        try:
+            ts = int(payload.get("ts"))
+        except (TypeError, ValueError, OverflowError):
+            return False
+        if not 0 < ts <= _INT64_MAX:  # must fit the int64 ts column
+            return False
+        i = self.cursor
+        if self.count and ts < self.ts[i - 1]:
+            # Out of order (client clocks, reordered requests): the ring isn't
+            # sorted until the older of this pair has been overwritten
+            self._unsorted = self.capacity - 1
+        elif self._unsorted:
+            self._unsorted -= 1
+        self.ts[i] = ts
+        self.lat[i] = _as_float(payload.get("e2e_latency_ms"))
+        self.up[i] = _as_float(payload.get("bytes_uplink"))
+        self.down[i] = _as_float(payload.get("bytes_downlink"))
+        self.cursor = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return True
+
+    def window(self, cutoff: int) -> np.ndarray:
+        # Slots with ts >= cutoff, oldest first. While ingest order is time order
+        # the slots form two sorted runs (head..end, 0..cursor) that can be
+        # binary searched; otherwise scan every slot
+        if self._unsorted:
+            head = self.cursor if self.count == self.capacity else 0
+            order = (head + np.arange(self.count)) % self.capacity
+            return order[self.ts[order] >= cutoff]
+        if self.count < self.capacity:
+            start = int(np.searchsorted(self.ts[: self.count], cutoff))
+            return np.arange(start, self.count)
+        older = self.ts[self.cursor :]
+        i = int(np.searchsorted(older, cutoff))
+        if i < len(older):
+            return np.r_[self.cursor + i : self.capacity, 0 : self.cursor]
+        j = int(np.searchsorted(self.ts[: self.cursor], cutoff))
+        return np.arange(j, self.cursor)
+
+
+metrics_ring = MetricsRing()
 
 
 @app.post("/metrics/ingest")
 async def metrics_ingest(payload: Dict[str, Any]):
-    metrics_store.append(payload)
-    # Limit memory
-    if len(metrics_store) > 10000:
-        del metrics_store[: len(metrics_store) - 10000]
-    return {"ok": True}
+    return {"ok": metrics_ring.append(payload)}
 
 
 @app.get("/metrics/summary")
@@ -247,34 +760,34 @@ async def metrics_summary(duration: int = 30):
     # duration is seconds window from now
     now_ms = int(time.time() * 1000)
     window_ms = duration * 1000
-    window = [m for m in metrics_store if m.get("ts", 0) >= now_ms - window_ms]
-    if not window:
-        return {
+    idx = metrics_ring.window(now_ms - window_ms)
+    count = len(idx)
+    if not count:
+        return ORJSONResponse({
             "count": 0,
             "median_latency_ms": None,
             "p95_latency_ms": None,
             "fps": 0.0,
             "kbps_uplink": 0.0,
             "kbps_downlink": 0.0,
-        }
-    lats = sorted([m.get("e2e_latency_ms", 0.0) for m in window])
+        })
+    lats = metrics_ring.lat[idx]
     def pct(p: float) -> float:
-        if not lats:
-            return 0.0
-        idx = min(len(lats) - 1, max(0, int(round(p * (len(lats) - 1)))))
-        return float(lats[idx])
-    duration_s = max(1.0, (window[-1]["ts"] - window[0]["ts"]) / 1000.0)
-    fps = len(window) / duration_s
-    kbps_uplink = sum(m.get("bytes_uplink", 0) for m in window) * 8.0 / 1000.0 / duration_s
-    kbps_downlink = sum(m.get("bytes_downlink", 0) for m in window) * 8.0 / 1000.0 / duration_s
-    return {
-        "count": len(window),
+        k = min(count - 1, max(0, int(round(p * (count - 1)))))
+        return float(np.partition(lats, k)[k])
+    ts = metrics_ring.ts
+    duration_s = max(1.0, float(ts[idx[-1]] - ts[idx[0]]) / 1000.0)
+    fps = count / duration_s
+    kbps_uplink = float(metrics_ring.up[idx].sum()) * 8.0 / 1000.0 / duration_s
+    kbps_downlink = float(metrics_ring.down[idx].sum()) * 8.0 / 1000.0 / duration_s
+    return ORJSONResponse({
+        "count": count,
         "median_latency_ms": pct(0.5),
         "p95_latency_ms": pct(0.95),
         "fps": fps,
         "kbps_uplink": kbps_uplink,
         "kbps_downlink": kbps_downlink,
-    }
+    })
 
 
 # Serve frontend build (SPA) if present
@@ -299,30 +812,27 @@ if _DIST_ROOT:
     if os.path.isdir(assets_dir):
         app.mount("/assets", StaticFiles(directory=assets_dir), name="assets")
 
-    # Serve WASM files with correct MIME type
-    @app.get("/ort-wasm.wasm")
-    async def serve_wasm():
-        wasm_path = os.path.join(_DIST_ROOT, "ort-wasm.wasm")
-        if os.path.exists(wasm_path):
-            with open(wasm_path, "rb") as f:
-                return Response(content=f.read(), media_type="application/wasm")
-        return Response(status_code=404)
-
-    @app.get("/ort-wasm-simd.wasm")
-    async def serve_wasm_simd():
-        wasm_path = os.path.join(_DIST_ROOT, "ort-wasm-simd.wasm")
-        if os.path.exists(wasm_path):
-            with open(wasm_path, "rb") as f:
-                return Response(content=f.read(), media_type="application/wasm")
-        return Response(status_code=404)
-
-    @app.get("/ort-wasm-threaded.wasm")
-    async def serve_wasm_threaded():
-        wasm_path = os.path.join(_DIST_ROOT, "ort-wasm-threaded.wasm")
-        if os.path.exists(wasm_path):
-            with open(wasm_path, "rb") as f:
-                return Response(content=f.read(), media_type="application/wasm")
-        return Response(status_code=404)
+    # Serve WASM files with correct MIME type. They only change with a new build,
+    # so stat once at startup and let FileResponse stream them with sendfile
+    _WASM_FILES = {}
+    for _entry in os.scandir(_DIST_ROOT):
+        if _entry.name.endswith(".wasm") and _entry.is_file():
+            _st = _entry.stat()
+            _WASM_FILES[_entry.name] = (_entry.path, _st, f'"{_st.st_mtime_ns:x}-{_st.st_size:x}"')
+    # The file names carry no content hash, so browsers must revalidate (cheap
+    # 304 via the ETag) rather than keep a stale build's WASM next to new JS
+    _WASM_CACHE_CONTROL = "no-cache"
+
+    @app.get("/{wasm_name}.wasm", include_in_schema=False)
+    async def serve_wasm(wasm_name: str, request: Request):
+        entry = _WASM_FILES.get(wasm_name + ".wasm")
+        if entry is None:
+            return Response(status_code=404)
+        path, stat_result, etag = entry
+        headers = {"Cache-Control": _WASM_CACHE_CONTROL, "ETag": etag}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, media_type="application/wasm", headers=headers, stat_result=stat_result)
 
     _INDEX_HTML = os.path.join(_DIST_ROOT, "index.html")
 
@@ -330,9 +840,15 @@ if _DIST_ROOT:
     async def serve_index():
         return FileResponse(_INDEX_HTML)
 
+    # Build output is static: index the servable files once instead of stat()ing per request
+    _SPA_FILES = frozenset(
+        os.path.relpath(os.path.join(r, f), _DIST_ROOT).replace(os.sep, "/")
+        for r, _, fs in os.walk(_DIST_ROOT)
+        for f in fs
+    )
+
     @app.get("/{full_path:path}", include_in_schema=False)
     async def spa_fallback(full_path: str):
-        file_path = os.path.join(_DIST_ROOT, full_path)
-        if os.path.isfile(file_path):
-            return FileResponse(file_path)
+        if ".." not in full_path and full_path in _SPA_FILES:
+            return FileResponse(os.path.join(_DIST_ROOT, full_path))
         return FileResponse(_INDEX_HTML)
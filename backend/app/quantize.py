@@ -0,0 +1,29 @@
+"""Offline INT8 quantization for the server-mode ONNX model.
+
+Usage: python -m app.quantize model.onnx model.int8.onnx
+
+Point ONNX_MODEL_INT8 at the output; the backend prefers it over ONNX_MODEL.
+Requires the `onnx` package alongside onnxruntime.
+
+Dynamic quantization needs no data. For static (QDQ) quantization, save a
+handful of real frames posted to /infer, preprocess them exactly as the model
+expects, and feed them through an onnxruntime.quantization.CalibrationDataReader
+whose get_next() yields {input_name: batch} until exhausted, then call
+quantize_static(src, dst, reader, quant_format=QuantFormat.QDQ).
+"""
+import sys
+
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+
+def main(argv: list[str]) -> int:
+    if len(argv) != 2:
+        print("usage: python -m app.quantize SRC.onnx DST.onnx", file=sys.stderr)
+        return 2
+    src, dst = argv
+    quantize_dynamic(src, dst, weight_type=QuantType.QInt8)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))